@@ -1,53 +1,91 @@
 #!/usr/bin/env python3
 import argparse
+import csv
 import datetime as dt
+import functools
+import hashlib
 import json
 import re
 import shutil
 import shlex
+import stat
 import subprocess
 import sys
 import os
 import urllib.request
+from collections import Counter
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 scriptVersion = "v2.0 (2026-02-27)"
 defaultAwsServer = "admin@aandewiel.nl"
 defaultAwsTarget = "/home/admin/flasherWebsite_v3"
 defaultAwsSshKey = "~/.ssh/LightsailDefaultKey-eu-central-1.pem"
 defaultProjectImageUrl = "https://flasher.aandewiel.nl/projects/ESP32project.png"
 
-versionPattern = re.compile(r"v\d+\.\d+\.\d+")
-envSectionPattern = re.compile(r"^\s*\[\s*env:([^\]]+)\s*\]\s*$")
-semverPattern = re.compile(r"(\d+)\.(\d+)\.(\d+)")
-versionWithPrefixPattern = re.compile(r"[vV](\d+\.\d+\.\d+)")
-workspaceDirPattern = re.compile(r"^\s*workspace_dir\s*=\s*(.+?)\s*$", re.IGNORECASE)
+progVersionPattern = re.compile(
+    r"PROG_VERSION[^\n]*?(?:[vV](\d+\.\d+\.\d+)|(\d+\.\d+\.\d+))"
+)
+platformioVarPattern = re.compile(r"\$\{([^}]+)\}|\$(\w+)")
 fsStartPattern = re.compile(r"_FS_start\s*=\s*(0x[0-9a-fA-F]+|\d+)")
+sectionHeaderPattern = re.compile(r"^\[(.+)\]$")
+inlineCommentPattern = re.compile(r"\s[;#]")
+unsafePathSegmentPattern = re.compile(r"[^A-Za-z0-9._-]+")
+nonAlphanumericPattern = re.compile(r"[^a-z0-9]")
+sourceFileSuffixes = {".c", ".cpp", ".h", ".hpp", ".ino"}
+buildCacheFileName = ".createProjectStructure_cache.json"
+partitionCsvFields = ("name", "type", "subtype", "offset", "size")
+
+
+def writeJsonFile(filePath: Path, payload: object) -> None:
+    if orjson is not None:
+        filePath.write_bytes(
+            orjson.dumps(payload, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        )
+        return
+
+    filePath.write_text(
+        json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
+    )
 
 
 def parsePlatformioSections(platformioIni: Path) -> dict[str, dict[str, str]]:
     sections: dict[str, dict[str, str]] = {}
     currentSection = None
 
-    for rawLine in platformioIni.read_text(encoding="utf-8", errors="ignore").splitlines():
-        line = rawLine.strip()
-        if not line or line.startswith(";") or line.startswith("#"):
-            continue
+    with platformioIni.open("r", encoding="utf-8", errors="ignore") as iniFile:
+        for rawLine in iniFile:
+            line = rawLine.strip()
+            if not line or line[0] in ";#":
+                continue
 
-        sectionMatch = re.match(r"^\[(.+)\]$", line)
-        if sectionMatch:
-            currentSection = sectionMatch.group(1).strip().lower()
-            if currentSection not in sections:
-                sections[currentSection] = {}
-            continue
+            sectionMatch = sectionHeaderPattern.match(line) if line[0] == "[" else None
+            if sectionMatch:
+                currentSection = sectionMatch.group(1).strip()
+                if currentSection.lower().startswith("env:"):
+                    currentSection = f"env:{currentSection[4:].strip()}"
+                else:
+                    currentSection = currentSection.lower()
+                if currentSection not in sections:
+                    sections[currentSection] = {}
+                continue
 
-        if currentSection is None or "=" not in rawLine:
-            continue
+            if currentSection is None:
+                continue
 
-        key, value = rawLine.split("=", 1)
-        normalizedKey = key.strip().lower()
-        normalizedValue = re.split(r"\s[;#]", value, maxsplit=1)[0].strip()
-        sections[currentSection][normalizedKey] = normalizedValue
+            key, separator, value = rawLine.partition("=")
+            if not separator:
+                continue
+
+            normalizedKey = key.strip().lower()
+            normalizedValue = inlineCommentPattern.split(value, maxsplit=1)[0].strip()
+            sections[currentSection][normalizedKey] = normalizedValue
 
     return sections
 
@@ -56,7 +94,7 @@ def getEnvConfigValue(
     sections: dict[str, dict[str, str]], envName: str, key: str
 ) -> str | None:
     normalizedKey = key.strip().lower()
-    envSection = f"env:{envName}".lower()
+    envSection = f"env:{envName}"
 
     if envSection in sections and normalizedKey in sections[envSection]:
         return sections[envSection][normalizedKey]
@@ -67,8 +105,19 @@ def getEnvConfigValue(
     return None
 
 
+def expandPlatformioVars(value: str, projectRoot: Path) -> str:
+    substitutions = {
+        "PROJECT_DIR": str(projectRoot),
+        "platformio.packages_dir": "",
+    }
+    return platformioVarPattern.sub(
+        lambda match: substitutions.get(match.group(1) or match.group(2), match.group(0)),
+        value,
+    )
+
+
 def sanitizePathSegment(value: str) -> str:
-    sanitized = re.sub(r"[^A-Za-z0-9._-]+", "_", value.strip())
+    sanitized = unsafePathSegmentPattern.sub("_", value.strip())
     sanitized = sanitized.strip("._-")
     if not sanitized:
         return "unknown"
@@ -92,8 +141,8 @@ def resolveEnvPlatformName(
 
 
 def detectSocFamily(boardName: str, platformName: str | None) -> str:
-    normalizedBoard = re.sub(r"[^a-z0-9]", "", (boardName or "").lower())
-    normalizedPlatform = re.sub(r"[^a-z0-9]", "", (platformName or "").lower())
+    normalizedBoard = nonAlphanumericPattern.sub("", (boardName or "").lower())
+    normalizedPlatform = nonAlphanumericPattern.sub("", (platformName or "").lower())
 
     esp8266BoardAliases = {
         "d1mini",
@@ -129,7 +178,7 @@ def resolveEnvPartitionsSource(
     socFamily: str,
 ) -> Path | None:
     configuredValue = None
-    envSection = f"env:{envName}".lower()
+    envSection = f"env:{envName}"
 
     if socFamily == "esp8266":
         envValues = sections.get(envSection, {})
@@ -140,17 +189,14 @@ def resolveEnvPartitionsSource(
     candidates: list[Path] = []
     if configuredValue:
         cleaned = configuredValue.strip().strip('"').strip("'")
-        cleaned = cleaned.replace("${PROJECT_DIR}", str(projectRoot))
-        cleaned = cleaned.replace("$PROJECT_DIR", str(projectRoot))
+        cleaned = expandPlatformioVars(cleaned, projectRoot)
         resolved = Path(cleaned).expanduser()
         if not resolved.is_absolute():
-            resolved = (projectRoot / resolved).resolve()
-        else:
-            resolved = resolved.resolve()
+            resolved = projectRoot / resolved
         candidates.append(resolved)
 
     if socFamily == "esp32":
-        defaultCandidate = (projectRoot / "partitions.csv").resolve()
+        defaultCandidate = projectRoot / "partitions.csv"
         candidates.append(defaultCandidate)
 
     for candidate in candidates:
@@ -174,13 +220,10 @@ def resolveEnvLdscriptSource(
         return None
 
     cleaned = configuredValue.strip().strip('"').strip("'")
-    cleaned = cleaned.replace("${PROJECT_DIR}", str(projectRoot))
-    cleaned = cleaned.replace("$PROJECT_DIR", str(projectRoot))
+    cleaned = expandPlatformioVars(cleaned, projectRoot)
     resolved = Path(cleaned).expanduser()
     if not resolved.is_absolute():
-        resolved = (projectRoot / resolved).resolve()
-    else:
-        resolved = resolved.resolve()
+        resolved = projectRoot / resolved
 
     if resolved.exists() and resolved.is_file():
         return resolved
@@ -213,26 +256,21 @@ def resolveGeneratedEsp8266Ldscript(buildDir: Path) -> Path | None:
 def parsePartitionsCsv(partitionsCsvPath: Path) -> dict[str, dict[str, str]]:
     partitions: dict[str, dict[str, str]] = {}
 
-    for rawLine in partitionsCsvPath.read_text(encoding="utf-8", errors="ignore").splitlines():
-        line = rawLine.strip()
-        if not line or line.startswith("#"):
-            continue
-
-        parts = [part.strip() for part in rawLine.split(",")]
-        if len(parts) < 4:
-            continue
+    with partitionsCsvPath.open(
+        "r", encoding="utf-8", errors="ignore", newline=""
+    ) as csvFile:
+        for row in csv.reader(csvFile, skipinitialspace=True, quoting=csv.QUOTE_NONE):
+            parts = list(map(str.strip, row))
+            if len(parts) < 4:
+                continue
 
-        name = parts[0]
-        if not name:
-            continue
+            name = parts[0]
+            if not name or name.startswith("#"):
+                continue
 
-        partitions[name] = {
-            "name": name,
-            "type": parts[1] if len(parts) > 1 else "",
-            "subtype": parts[2] if len(parts) > 2 else "",
-            "offset": parts[3] if len(parts) > 3 else "",
-            "size": parts[4] if len(parts) > 4 else "",
-        }
+            partitions[name] = dict(
+                zip(partitionCsvFields, parts + [""] * (len(partitionCsvFields) - len(parts)))
+            )
 
     return partitions
 
@@ -240,45 +278,42 @@ def parsePartitionsCsv(partitionsCsvPath: Path) -> dict[str, dict[str, str]]:
 def detectFirmwareOffset(partitions: dict[str, dict[str, str]], socFamily: str) -> str:
     if socFamily == "esp8266":
         firmwareEntry = partitions.get("firmware") if isinstance(partitions, dict) else None
-        if firmwareEntry and firmwareEntry.get("offset"):
-            return firmwareEntry["offset"]
+        if firmwareEntry and (firmwareOffset := firmwareEntry.get("offset")):
+            return firmwareOffset
         return "0x00000"
 
-    if "factory" in partitions and partitions["factory"].get("offset"):
-        return partitions["factory"]["offset"]
-    if "app0" in partitions and partitions["app0"].get("offset"):
-        return partitions["app0"]["offset"]
-    if "ota_0" in partitions and partitions["ota_0"].get("offset"):
-        return partitions["ota_0"]["offset"]
-    if "firmware" in partitions and partitions["firmware"].get("offset"):
-        return partitions["firmware"]["offset"]
+    for name in ("factory", "app0", "ota_0", "firmware"):
+        entry = partitions.get(name)
+        if entry and (entryOffset := entry.get("offset")):
+            return entryOffset
 
     for part in partitions.values():
-        partType = str(part.get("type") or "").strip().lower()
-        partSubtype = str(part.get("subtype") or "").strip().lower()
-
-        if partType in {"app", "0", "0x00"} and part.get("offset"):
-            return part["offset"]
+        partOffset = part.get("offset")
+        if not partOffset:
+            continue
 
-        if partSubtype in {"factory", "app0", "ota_0", "ota0"} and part.get("offset"):
-            return part["offset"]
+        partType = str(part.get("type") or "").strip().lower()
+        if partType in {"app", "0", "0x00"}:
+            return partOffset
 
-    if socFamily == "esp8266":
-        return "0x00000"
+        partSubtype = str(part.get("subtype") or "").strip().lower()
+        if partSubtype in {"factory", "app0", "ota_0", "ota0"}:
+            return partOffset
 
     return "0x10000"
 
 
 def detectFilesystemOffset(partitions: dict[str, dict[str, str]]) -> str | None:
-    directNames = ["spiffs", "littlefs", "fatfs"]
-    for name in directNames:
-        if name in partitions and partitions[name].get("offset"):
-            return partitions[name]["offset"]
-
+    filesystemNames = {"spiffs", "littlefs", "fatfs"}
     for part in partitions.values():
+        partOffset = part.get("offset")
+        if not partOffset:
+            continue
+
+        name = (part.get("name") or "").lower()
         subtype = (part.get("subtype") or "").lower()
-        if subtype in {"spiffs", "littlefs", "fatfs"} and part.get("offset"):
-            return part["offset"]
+        if name in filesystemNames or subtype in filesystemNames:
+            return partOffset
 
     return None
 
@@ -308,7 +343,7 @@ def detectEsp8266FilesystemOffsetFromLdscript(ldscriptPath: Path) -> str | None:
 
 
 def isEsp32S3Board(boardName: str) -> bool:
-    normalized = re.sub(r"[^a-z0-9]", "", boardName.lower())
+    normalized = nonAlphanumericPattern.sub("", boardName.lower())
     return "esp32s3" in normalized
 
 
@@ -320,12 +355,14 @@ def generateFlashJson(
     ldscriptSource: Path | None,
     logLines: list[str],
 ) -> None:
-    partitionsCsvPath = targetVersionDir / "partitions.csv"
+    with os.scandir(targetVersionDir) as entries:
+        presentNames = {entry.name for entry in entries if entry.is_file()}
+
     partitions: dict[str, dict[str, str]] = {}
 
-    if partitionsCsvPath.exists():
+    if "partitions.csv" in presentNames:
         try:
-            partitions = parsePartitionsCsv(partitionsCsvPath)
+            partitions = parsePartitionsCsv(targetVersionDir / "partitions.csv")
         except Exception as exc:
             logLines.append(f"WARN: partitions.csv parse failed: {exc}")
 
@@ -333,27 +370,23 @@ def generateFlashJson(
     if socFamily == "esp32":
         bootloaderOffset = "0x0000" if isEsp32S3Board(boardName) else "0x1000"
 
-        bootloaderPath = targetVersionDir / "bootloader.bin"
-        if bootloaderPath.exists():
+        if "bootloader.bin" in presentNames:
             flashFiles.append({"offset": bootloaderOffset, "file": "bootloader.bin"})
 
-        partitionsBinPath = targetVersionDir / "partitions.bin"
-        if partitionsBinPath.exists():
+        if "partitions.bin" in presentNames:
             flashFiles.append({"offset": "0x8000", "file": "partitions.bin"})
 
-        bootAppPath = targetVersionDir / "boot_app0.bin"
-        if bootAppPath.exists():
+        if "boot_app0.bin" in presentNames:
             flashFiles.append({"offset": "0xe000", "file": "boot_app0.bin"})
 
-    firmwarePath = targetVersionDir / "firmware.bin"
-    if firmwarePath.exists():
+    if "firmware.bin" in presentNames:
         firmwareOffset = detectFirmwareOffset(partitions, socFamily)
         flashFiles.append({"offset": firmwareOffset, "file": "firmware.bin"})
 
     filesystemFile = None
-    if (targetVersionDir / "LittleFS.bin").exists():
+    if "LittleFS.bin" in presentNames:
         filesystemFile = "LittleFS.bin"
-    elif (targetVersionDir / "spiffs.bin").exists():
+    elif "spiffs.bin" in presentNames:
         filesystemFile = "spiffs.bin"
 
     if filesystemFile:
@@ -382,114 +415,82 @@ def generateFlashJson(
         "version": version,
         "flash_files": flashFiles,
     }
-    (targetVersionDir / "flash.json").write_text(
-        json.dumps(flashPayload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
-    )
-
-
-def parseEnvs(platformioIni: Path) -> list[str]:
-    envs: list[str] = []
-    for line in platformioIni.read_text(encoding="utf-8", errors="ignore").splitlines():
-        match = envSectionPattern.match(line)
-        if match:
-            envs.append(match.group(1).strip())
-
-    seen = set()
-    uniqueEnvs = []
-    for env in envs:
-        if env and env not in seen:
-            uniqueEnvs.append(env)
-            seen.add(env)
-
-    return uniqueEnvs
-
+    writeJsonFile(targetVersionDir / "flash.json", flashPayload)
 
-def getWorkspaceDir(platformioIni: Path, projectPath: Path) -> Path:
-    sectionName = ""
-    workspaceValue = None
 
-    for rawLine in platformioIni.read_text(encoding="utf-8", errors="ignore").splitlines():
-        line = rawLine.strip()
-        if not line or line.startswith(";") or line.startswith("#"):
-            continue
-
-        sectionMatch = re.match(r"^\[(.+)\]$", line)
-        if sectionMatch:
-            sectionName = sectionMatch.group(1).strip().lower()
-            continue
-
-        if sectionName != "platformio":
-            continue
-
-        keyMatch = workspaceDirPattern.match(rawLine)
-        if keyMatch:
-            workspaceValue = keyMatch.group(1).strip()
-            break
-
-    if not workspaceValue:
-        return projectPath / ".pio"
-
-    expanded = workspaceValue
-    expanded = expanded.replace("${PROJECT_DIR}", str(projectPath))
-    expanded = expanded.replace("$PROJECT_DIR", str(projectPath))
-    expanded = expanded.replace("${platformio.packages_dir}", "")
+def resolveProjectOptionPath(value: str, projectPath: Path) -> Path:
+    cleaned = value.strip().strip('"').strip("'")
+    expanded = expandPlatformioVars(cleaned, projectPath)
     resolved = Path(expanded).expanduser()
     if not resolved.is_absolute():
-        resolved = (projectPath / resolved).resolve()
-    else:
-        resolved = resolved.resolve()
+        resolved = projectPath / resolved
     return resolved
 
 
-def normalizeVersion(versionValue: str) -> str:
-    match = semverPattern.search(versionValue)
-    if not match:
-        return "v0.0.0"
-    return f"v{match.group(1)}.{match.group(2)}.{match.group(3)}"
+def getProjectDir(
+    sections: dict[str, dict[str, str]], projectPath: Path, optionName: str, defaultName: str
+) -> Path:
+    configuredValue = sections.get("platformio", {}).get(optionName)
 
+    if not configuredValue:
+        return projectPath / defaultName
 
-def detectVersion(srcDir: Path) -> str:
-    if not srcDir.is_dir():
-        return "v0.0.0"
+    return resolveProjectOptionPath(configuredValue, projectPath)
 
-    for filePath in sorted(srcDir.rglob("*")):
-        if not filePath.is_file():
-            continue
 
-        text = filePath.read_text(encoding="utf-8", errors="ignore")
-        if "PROG_VERSION" not in text:
-            continue
+def getWorkspaceDir(sections: dict[str, dict[str, str]], projectPath: Path) -> Path:
+    return getProjectDir(sections, projectPath, "workspace_dir", ".pio")
 
-        for line in text.splitlines():
-            if "PROG_VERSION" not in line:
-                continue
 
-            prefixedMatch = versionWithPrefixPattern.search(line)
-            if prefixedMatch:
-                return f"v{prefixedMatch.group(1)}"
+def detectVersion(srcDir: Path) -> str:
+    if not srcDir.is_dir():
+        return "v0.0.0"
 
-            semverMatch = semverPattern.search(line)
-            if semverMatch:
-                return f"v{semverMatch.group(1)}.{semverMatch.group(2)}.{semverMatch.group(3)}"
+    sourceFiles = sorted(
+        filePath
+        for filePath in srcDir.rglob("*")
+        if filePath.suffix.lower() in sourceFileSuffixes and filePath.is_file()
+    )
+    for filePath in sourceFiles:
+        with filePath.open("r", encoding="utf-8", errors="ignore") as sourceFile:
+            for line in sourceFile:
+                if "PROG_VERSION" not in line:
+                    continue
 
-            fallbackMatch = versionPattern.search(line)
-            if fallbackMatch:
-                return normalizeVersion(fallbackMatch.group(0))
+                versionMatch = progVersionPattern.search(line)
+                if versionMatch:
+                    return f"v{versionMatch.group(1) or versionMatch.group(2)}"
 
     return "v0.0.0"
 
 
-def runCommand(cmd: list[str], cwd: Path, logLines: list[str]) -> None:
+def runCommand(
+    cmd: list[str], cwd: Path, logLines: list[str], echoOutput: bool = False
+) -> None:
     logLines.append(f"$ {' '.join(cmd)}")
-    process = subprocess.run(cmd, cwd=str(cwd), text=True, capture_output=True)
-    if process.stdout:
-        logLines.append(process.stdout.rstrip())
-    if process.stderr:
-        logLines.append(process.stderr.rstrip())
+    if echoOutput:
+        print(logLines[-1])
+    process = subprocess.Popen(
+        cmd,
+        cwd=str(cwd),
+        text=True,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=1,
+    )
+    try:
+        with process.stdout:
+            for line in process.stdout:
+                logLines.append(line.rstrip())
+                if echoOutput:
+                    print(line, end="")
+    except BaseException:
+        process.kill()
+        raise
+    finally:
+        process.wait()
     if process.returncode != 0:
-        raise RuntimeError(
-            f"Command failed ({process.returncode}): {' '.join(cmd)}\n{process.stderr}"
-        )
+        raise RuntimeError(f"Command failed ({process.returncode}): {' '.join(cmd)}")
 
 
 def discoverBuildDir(projectRoot: Path, workspaceDir: Path, envName: str) -> Path:
@@ -498,14 +499,20 @@ def discoverBuildDir(projectRoot: Path, workspaceDir: Path, envName: str) -> Pat
         return directCandidate
 
     buildRoot = workspaceDir / "build"
-    if buildRoot.exists():
-        for child in sorted(buildRoot.iterdir()):
-            if not child.is_dir():
-                continue
-            if child.name == envName:
-                return child
-            if envName in child.name and (child / "firmware.bin").exists():
-                return child
+    try:
+        with os.scandir(buildRoot) as entries:
+            matchingDirs = [
+                entry.path
+                for entry in entries
+                if envName in entry.name
+                and entry.is_dir()
+                and os.path.exists(os.path.join(entry.path, "firmware.bin"))
+            ]
+    except (FileNotFoundError, NotADirectoryError):
+        matchingDirs = []
+
+    if matchingDirs:
+        return Path(min(matchingDirs))
 
     fallbackPio = projectRoot / ".pio" / "build" / envName
     if fallbackPio.exists():
@@ -516,6 +523,22 @@ def discoverBuildDir(projectRoot: Path, workspaceDir: Path, envName: str) -> Pat
     )
 
 
+def getCachedProjectImage() -> Path:
+    cacheRoot = os.environ.get("XDG_CACHE_HOME") or str(Path.home() / ".cache")
+    cacheDir = Path(cacheRoot) / "createProjectStructure"
+    cachedImage = cacheDir / "ESP32project.png"
+    if cachedImage.is_file():
+        return cachedImage
+
+    cacheDir.mkdir(parents=True, exist_ok=True)
+    partialImage = cachedImage.with_suffix(".part")
+    with urllib.request.urlopen(defaultProjectImageUrl, timeout=5) as response:
+        with partialImage.open("wb") as imageFile:
+            shutil.copyfileobj(response, imageFile)
+    partialImage.replace(cachedImage)
+    return cachedImage
+
+
 def ensureProjectMetaDataDefaults(rootDir: Path) -> Path:
     metaDataDir = rootDir / "projectMetaData"
     if metaDataDir.exists() and metaDataDir.is_dir():
@@ -540,36 +563,62 @@ def ensureProjectMetaDataDefaults(rootDir: Path) -> Path:
         "post_url": "https://willem.aandewiel.nl/",
         "image": "thisProject.png",
     }
-    (metaDataDir / "project.json").write_text(
-        json.dumps(payload, ensure_ascii=False, indent=2) + "\n", encoding="utf-8"
-    )
+    writeJsonFile(metaDataDir / "project.json", payload)
 
     targetImage = metaDataDir / "thisProject.png"
     try:
-        urllib.request.urlretrieve(defaultProjectImageUrl, str(targetImage))
+        shutil.copy2(getCachedProjectImage(), targetImage)
     except Exception:
         targetImage.touch()
 
     return metaDataDir
 
 
+def runCopyJobs(
+    copyJobs: dict[Path, Path | str], copyFunction: Callable[[Path | str, Path], object]
+) -> None:
+    with ThreadPoolExecutor(max_workers=4) as copyExecutor:
+        copyFutures = [
+            copyExecutor.submit(copyFunction, source, destination)
+            for destination, source in copyJobs.items()
+        ]
+        for copyFuture in copyFutures:
+            copyFuture.result()
+
+
 def copyProjectMetaData(metaDataDir: Path, targetProjectDir: Path) -> None:
-    for item in sorted(metaDataDir.iterdir()):
-        if not item.is_file():
-            continue
+    renamedFiles = {"ESP32project.png": "thisProject.png"}
+
+    with os.scandir(metaDataDir) as entries:
+        copyJobs = {
+            targetProjectDir / renamedFiles.get(entry.name, entry.name): entry.path
+            for entry in sorted(entries, key=lambda item: item.name)
+            if entry.is_file()
+        }
+
+    runCopyJobs(copyJobs, shutil.copy2)
 
-        destinationName = item.name
-        if item.name == "ESP32project.png":
-            destinationName = "thisProject.png"
 
-        shutil.copy2(item, targetProjectDir / destinationName)
+def copyFileRange(source: Path, destination: Path) -> None:
+    with open(source, "rb") as sourceFile, open(destination, "wb") as destinationFile:
+        remaining = os.fstat(sourceFile.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(sourceFile.fileno(), destinationFile.fileno(), remaining)
+            if copied == 0:
+                raise OSError(f"copy_file_range stopped early: {remaining} bytes left")
+            remaining -= copied
 
 
-def copyIfExists(source: Path, destination: Path) -> bool:
-    if source.exists() and source.is_file():
-        shutil.copy2(source, destination)
-        return True
-    return False
+def fastCopy(source: Path, destination: Path) -> None:
+    if hasattr(os, "copy_file_range"):
+        try:
+            copyFileRange(source, destination)
+        except OSError:
+            shutil.copyfile(source, destination)
+    else:
+        shutil.copyfile(source, destination)
+    sourceStat = os.stat(source)
+    os.utime(destination, ns=(sourceStat.st_atime_ns, sourceStat.st_mtime_ns))
 
 
 def collectAndCopyArtifacts(
@@ -592,11 +641,15 @@ def collectAndCopyArtifacts(
         if effectiveLdscriptSource:
             logLines.append(f"Using generated ldscript source: {effectiveLdscriptSource}")
 
-    required = buildDir / "firmware.bin"
-    if not required.exists():
+    with os.scandir(buildDir) as entries:
+        buildFileNames = {entry.name for entry in entries if entry.is_file()}
+
+    if "firmware.bin" not in buildFileNames:
         raise RuntimeError(f"firmware.bin not found for env '{envName}'")
 
-    shutil.copy2(required, targetVersionDir / "firmware.bin")
+    copyJobs: dict[Path, Path] = {
+        targetVersionDir / "firmware.bin": buildDir / "firmware.bin",
+    }
 
     optionalFiles = [
         "boot_app0.bin",
@@ -605,16 +658,16 @@ def collectAndCopyArtifacts(
         "partitions.csv",
     ]
     for name in optionalFiles:
-        copyIfExists(buildDir / name, targetVersionDir / name)
+        if name in buildFileNames:
+            copyJobs[targetVersionDir / name] = buildDir / name
 
-    targetPartitionsCsv = targetVersionDir / "partitions.csv"
-    if envPartitionsSource and envPartitionsSource.exists():
-        shutil.copy2(envPartitionsSource, targetPartitionsCsv)
+    if envPartitionsSource:
+        copyJobs[targetVersionDir / "partitions.csv"] = envPartitionsSource
         logLines.append(f"Using partitions source: {envPartitionsSource}")
 
-    if effectiveLdscriptSource and effectiveLdscriptSource.exists():
-        shutil.copy2(effectiveLdscriptSource, targetVersionDir / "ldscript.ld")
-        if envLdscriptSource and envLdscriptSource.exists():
+    if effectiveLdscriptSource:
+        copyJobs[targetVersionDir / "ldscript.ld"] = effectiveLdscriptSource
+        if envLdscriptSource:
             logLines.append(f"Using ldscript source: {envLdscriptSource}")
 
     fsCandidates = [
@@ -623,9 +676,12 @@ def collectAndCopyArtifacts(
         ("LittleFS.bin", "LittleFS.bin"),
     ]
     for sourceName, destName in fsCandidates:
-        if copyIfExists(buildDir / sourceName, targetVersionDir / destName):
+        if sourceName in buildFileNames:
+            copyJobs[targetVersionDir / destName] = buildDir / sourceName
             break
 
+    runCopyJobs(copyJobs, fastCopy)
+
     generateFlashJson(
         targetVersionDir,
         boardName,
@@ -644,11 +700,168 @@ def collectAndCopyArtifacts(
     buildLogPath.write_text("\n".join(logBody).strip() + "\n", encoding="utf-8")
 
 
-def resolveExecutable(commandName: str, preferredPaths: list[str]) -> str:
+def collectDirFiles(dirPath: Path) -> list[Path]:
+    if not dirPath.is_dir():
+        return []
+    return [filePath for filePath in dirPath.rglob("*") if filePath.is_file()]
+
+
+def collectProjectSourceFiles(
+    projectPath: Path, sections: dict[str, dict[str, str]]
+) -> list[Path]:
+    sourceFiles = [projectPath / "platformio.ini"]
+    for optionName, defaultName in (
+        ("src_dir", "src"),
+        ("include_dir", "include"),
+        ("lib_dir", "lib"),
+        ("data_dir", "data"),
+        ("boards_dir", "boards"),
+    ):
+        dirPath = getProjectDir(sections, projectPath, optionName, defaultName)
+        sourceFiles.extend(collectDirFiles(dirPath))
+    return sourceFiles
+
+
+def collectPlatformioPackageFiles(
+    projectPath: Path, sections: dict[str, dict[str, str]]
+) -> list[Path]:
+    coreDirValue = (
+        os.environ.get("PLATFORMIO_CORE_DIR")
+        or sections.get("platformio", {}).get("core_dir")
+        or "~/.platformio"
+    )
+    coreDir = resolveProjectOptionPath(coreDirValue, projectPath)
+    return [
+        *coreDir.glob("platforms/*/platform.json"),
+        *coreDir.glob("packages/*/package.json"),
+    ]
+
+
+def collectEnvLibdepsFiles(workspaceDir: Path, envName: str) -> list[Path]:
+    libdepsDir = workspaceDir / "libdeps" / envName
+    return [
+        *libdepsDir.glob("*/.piopm"),
+        *libdepsDir.glob("*/library.json"),
+        *libdepsDir.glob("*/library.properties"),
+    ]
+
+
+def getPlatformioCoreVersion(projectPath: Path) -> str:
+    try:
+        process = subprocess.run(
+            ["pio", "--version"], cwd=str(projectPath), text=True, capture_output=True
+        )
+    except OSError:
+        return ""
+    return process.stdout.strip()
+
+
+def collectEnvSourceFiles(
+    projectPath: Path, sections: dict[str, dict[str, str]], envName: str
+) -> list[Path]:
+    sourceFiles: list[Path] = []
+
+    for scriptValue in (getEnvConfigValue(sections, envName, "extra_scripts") or "").split(","):
+        scriptValue = scriptValue.strip()
+        for scriptPrefix in ("pre:", "post:"):
+            scriptValue = scriptValue.removeprefix(scriptPrefix)
+        if not scriptValue:
+            continue
+        scriptPath = resolveProjectOptionPath(scriptValue, projectPath)
+        if scriptPath.is_file():
+            sourceFiles.append(scriptPath)
+
+    for libDirValue in (getEnvConfigValue(sections, envName, "lib_extra_dirs") or "").split(","):
+        if libDirValue.strip():
+            sourceFiles.extend(collectDirFiles(resolveProjectOptionPath(libDirValue, projectPath)))
+
+    return sourceFiles
+
+
+def hashFileStats(filePaths: list[Path], seed: str = "") -> str:
+    digest = hashlib.sha256(seed.encode("utf-8"))
+    for filePath in sorted(filePaths):
+        fileStat = filePath.stat()
+        digest.update(f"{filePath}\0{fileStat.st_mtime_ns}\0{fileStat.st_size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def hashFileContent(filePath: Path) -> str:
+    digest = hashlib.sha256()
+    with filePath.open("rb") as fileHandle:
+        for chunk in iter(lambda: fileHandle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def loadBuildCache(workspaceDir: Path) -> dict[str, dict[str, str]]:
+    cachePath = workspaceDir / buildCacheFileName
+    try:
+        payload = json.loads(cachePath.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return payload if isinstance(payload, dict) else {}
+
+
+def saveBuildCache(workspaceDir: Path, buildCache: dict[str, dict[str, str]]) -> None:
+    workspaceDir.mkdir(parents=True, exist_ok=True)
+    writeJsonFile(workspaceDir / buildCacheFileName, buildCache)
+
+
+def isEnvBuildCached(
+    projectRoot: Path,
+    workspaceDir: Path,
+    envName: str,
+    envFingerprint: str,
+    buildCache: dict[str, dict[str, str]],
+) -> bool:
+    cacheEntry = buildCache.get(envName)
+    if not isinstance(cacheEntry, dict) or cacheEntry.get("fingerprint") != envFingerprint:
+        return False
+
+    try:
+        buildDir = discoverBuildDir(projectRoot, workspaceDir, envName)
+    except RuntimeError:
+        return False
+
+    firmwarePath = buildDir / "firmware.bin"
+    if not firmwarePath.is_file():
+        return False
+
+    return hashFileContent(firmwarePath) == cacheEntry.get("firmwareSha256")
+
+
+def buildOneEnv(
+    env: str,
+    projectPath: Path,
+    dataDir: Path,
+    logLines: list[str],
+    pioOptions: list[str],
+    echoOutput: bool = False,
+) -> None:
+    runCommand(["pio", "run", "-e", env, *pioOptions], projectPath, logLines, echoOutput)
+
+    if dataDir.is_dir():
+        try:
+            runCommand(
+                ["pio", "run", "-e", env, "-t", "buildfs", *pioOptions],
+                projectPath,
+                logLines,
+                echoOutput,
+            )
+        except RuntimeError as exc:
+            logLines.append(f"WARN: buildfs niet gelukt voor {env}: {exc}")
+
+
+@functools.lru_cache(maxsize=None)
+def resolveExecutable(commandName: str, preferredPaths: tuple[str, ...]) -> str:
     for preferredPath in preferredPaths:
-        pathObj = Path(preferredPath)
-        if pathObj.exists() and os.access(pathObj, os.X_OK):
-            return str(pathObj)
+        try:
+            pathMode = os.stat(preferredPath).st_mode
+        except OSError:
+            continue
+        if stat.S_ISREG(pathMode) and pathMode & 0o111:
+            return preferredPath
 
     detectedPath = shutil.which(commandName)
     if detectedPath:
@@ -657,6 +870,17 @@ def resolveExecutable(commandName: str, preferredPaths: list[str]) -> str:
     raise RuntimeError(f"Executable not found: {commandName}")
 
 
+def runStreamingCommand(cmd: list[str]) -> int:
+    sys.stdout.flush()
+    outputBuffer = sys.stdout.buffer
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    with process.stdout:
+        for chunk in iter(lambda: process.stdout.read1(65536), b""):
+            outputBuffer.write(chunk)
+            outputBuffer.flush()
+    return process.wait()
+
+
 def syncProjectToAws(
     projectsRoot: Path,
     projectName: str,
@@ -665,8 +889,8 @@ def syncProjectToAws(
     awsSshKey: Path,
     awsDryRun: bool,
 ) -> None:
-    rsyncPath = resolveExecutable("rsync", ["/usr/bin/rsync"])
-    sshPath = resolveExecutable("ssh", ["/usr/bin/ssh"])
+    rsyncPath = resolveExecutable("rsync", ("/usr/bin/rsync",))
+    sshPath = resolveExecutable("ssh", ("/usr/bin/ssh",))
 
     sourceProjectPath = projectsRoot / projectName
     if not sourceProjectPath.exists():
@@ -675,23 +899,6 @@ def syncProjectToAws(
     remoteProjectBase = f"{awsTarget.rstrip('/')}/projects"
     remoteProjectPath = f"{remoteProjectBase}/{projectName}"
 
-    mkdirCmd = [
-        sshPath,
-        "-o",
-        "BatchMode=yes",
-        "-o",
-        "ConnectTimeout=10",
-        "-i",
-        str(awsSshKey),
-        awsServer,
-        f"mkdir -p {shlex.quote(remoteProjectPath)}",
-    ]
-    mkdirProcess = subprocess.run(mkdirCmd, text=True, capture_output=True)
-    if mkdirProcess.returncode != 0:
-        raise RuntimeError(
-            f"Failed to create AWS project directory: {mkdirProcess.stderr.strip() or mkdirProcess.stdout.strip()}"
-        )
-
     sshRsyncTransport = (
         f"{sshPath} -o BatchMode=yes -o ConnectTimeout=10 -i {shlex.quote(str(awsSshKey))}"
     )
@@ -711,6 +918,7 @@ def syncProjectToAws(
         "--exclude",
         ".venv/",
     ]
+    rsyncCmd.append(f"--rsync-path=mkdir -p {shlex.quote(remoteProjectPath)} && rsync")
     if awsDryRun:
         rsyncCmd.extend(["--dry-run", "--itemize-changes"])
 
@@ -726,13 +934,9 @@ def syncProjectToAws(
     print(f"  Remote: {awsServer}:{remoteProjectPath}")
     print(f"  SSH key: {awsSshKey}")
     print(f"  Binaries: rsync={rsyncPath}, ssh={sshPath}")
-    process = subprocess.run(rsyncCmd, text=True, capture_output=True)
-    if process.stdout:
-        print(process.stdout.strip())
-    if process.stderr:
-        print(process.stderr.strip())
-    if process.returncode != 0:
-        raise RuntimeError(f"AWS rsync failed with code {process.returncode}")
+    returnCode = runStreamingCommand(rsyncCmd)
+    if returnCode != 0:
+        raise RuntimeError(f"AWS rsync failed with code {returnCode}")
 
 
 def syncProjectsFolderToAws(
@@ -742,31 +946,14 @@ def syncProjectsFolderToAws(
     awsSshKey: Path,
     awsDryRun: bool,
 ) -> None:
-    rsyncPath = resolveExecutable("rsync", ["/usr/bin/rsync"])
-    sshPath = resolveExecutable("ssh", ["/usr/bin/ssh"])
+    rsyncPath = resolveExecutable("rsync", ("/usr/bin/rsync",))
+    sshPath = resolveExecutable("ssh", ("/usr/bin/ssh",))
 
     if not projectsRoot.exists() or not projectsRoot.is_dir():
         raise RuntimeError(f"Projects directory does not exist for sync: {projectsRoot}")
 
     remoteProjectsPath = f"{awsTarget.rstrip('/')}/projects"
 
-    mkdirCmd = [
-        sshPath,
-        "-o",
-        "BatchMode=yes",
-        "-o",
-        "ConnectTimeout=10",
-        "-i",
-        str(awsSshKey),
-        awsServer,
-        f"mkdir -p {shlex.quote(remoteProjectsPath)}",
-    ]
-    mkdirProcess = subprocess.run(mkdirCmd, text=True, capture_output=True)
-    if mkdirProcess.returncode != 0:
-        raise RuntimeError(
-            f"Failed to create AWS projects directory: {mkdirProcess.stderr.strip() or mkdirProcess.stdout.strip()}"
-        )
-
     sshRsyncTransport = (
         f"{sshPath} -o BatchMode=yes -o ConnectTimeout=10 -i {shlex.quote(str(awsSshKey))}"
     )
@@ -786,6 +973,7 @@ def syncProjectsFolderToAws(
         "--exclude",
         ".venv/",
     ]
+    rsyncCmd.append(f"--rsync-path=mkdir -p {shlex.quote(remoteProjectsPath)} && rsync")
     if awsDryRun:
         rsyncCmd.extend(["--dry-run", "--itemize-changes"])
 
@@ -801,20 +989,39 @@ def syncProjectsFolderToAws(
     print(f"  Remote: {awsServer}:{remoteProjectsPath}")
     print(f"  SSH key: {awsSshKey}")
     print(f"  Binaries: rsync={rsyncPath}, ssh={sshPath}")
-    process = subprocess.run(rsyncCmd, text=True, capture_output=True)
-    if process.stdout:
-        print(process.stdout.strip())
-    if process.stderr:
-        print(process.stderr.strip())
-    if process.returncode != 0:
-        raise RuntimeError(f"AWS rsync failed with code {process.returncode}")
+    returnCode = runStreamingCommand(rsyncCmd)
+    if returnCode != 0:
+        raise RuntimeError(f"AWS rsync failed with code {returnCode}")
+
+
+def scanFlashJsonArtifacts(projectDir: Path) -> tuple[bool, bool]:
+    hasFlashJson = False
+    pendingDirs = [str(projectDir)]
+
+    while pendingDirs:
+        currentDir = pendingDirs.pop()
+        with os.scandir(currentDir) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pendingDirs.append(entry.path)
+                    continue
+
+                if entry.name != "flash.json" or not entry.is_file():
+                    continue
+
+                hasFlashJson = True
+                if os.path.isfile(os.path.join(currentDir, "firmware.bin")):
+                    return True, True
+
+    return hasFlashJson, False
 
 
 def validateProjectsFolderForAwsSync(projectsRoot: Path) -> None:
     if not projectsRoot.exists() or not projectsRoot.is_dir():
         raise RuntimeError(f"Projects directory does not exist: {projectsRoot}")
 
-    projectDirs = sorted([path for path in projectsRoot.iterdir() if path.is_dir()])
+    with os.scandir(projectsRoot) as entries:
+        projectDirs = [Path(entry.path) for entry in entries if entry.is_dir()]
     if not projectDirs:
         raise RuntimeError(f"Projects directory is empty: {projectsRoot}")
 
@@ -822,33 +1029,30 @@ def validateProjectsFolderForAwsSync(projectsRoot: Path) -> None:
     validationErrors: list[str] = []
 
     for projectDir in projectDirs:
-        for fileName in requiredMetaFiles:
-            if not (projectDir / fileName).is_file():
+        missingMetaFiles = [
+            fileName for fileName in requiredMetaFiles if not (projectDir / fileName).is_file()
+        ]
+        if missingMetaFiles:
+            for fileName in missingMetaFiles:
                 validationErrors.append(
                     f"{projectDir.name}: missing metadata file '{fileName}'"
                 )
+            continue
 
-        versionArtifacts = sorted(projectDir.rglob("flash.json"))
-        if not versionArtifacts:
+        hasFlashJson, hasValidArtifactSet = scanFlashJsonArtifacts(projectDir)
+        if not hasFlashJson:
             validationErrors.append(
                 f"{projectDir.name}: no build output found (flash.json is missing)"
             )
             continue
 
-        hasValidArtifactSet = False
-        for flashJsonPath in versionArtifacts:
-            artifactDir = flashJsonPath.parent
-            if (artifactDir / "firmware.bin").is_file():
-                hasValidArtifactSet = True
-                break
-
         if not hasValidArtifactSet:
             validationErrors.append(
                 f"{projectDir.name}: invalid build output (firmware.bin is missing next to flash.json)"
             )
 
     if validationErrors:
-        errorLines = "\n  - " + "\n  - ".join(validationErrors)
+        errorLines = "\n  - " + "\n  - ".join(sorted(validationErrors))
         raise RuntimeError(
             "Projects directory is not correctly populated for --only-sync-aws:" + errorLines
         )
@@ -856,7 +1060,7 @@ def validateProjectsFolderForAwsSync(projectsRoot: Path) -> None:
 
 def main() -> int:
     parser = argparse.ArgumentParser(
-        usage="%(prog)s [platformioProject] [--sync-aws | --only-sync-aws] [--aws-dry-run]",
+        usage="%(prog)s [platformioProject] [--sync-aws | --only-sync-aws] [--force-build] [--aws-dry-run]",
         description=f"createProjectStructure.py {scriptVersion}\nCreate projects structure from a PlatformIO project.",
     )
     parser.add_argument(
@@ -875,6 +1079,11 @@ def main() -> int:
         action="store_true",
         help="Skip build and only sync the full local projects directory to AWS",
     )
+    parser.add_argument(
+        "--force-build",
+        action="store_true",
+        help="Run pio for every environment even when its sources are unchanged",
+    )
     parser.add_argument(
         "--aws-dry-run",
         action="store_true",
@@ -925,23 +1134,23 @@ def main() -> int:
     if not platformioIni.exists():
         raise SystemExit(f"platformio.ini not found in: {projectPath}")
 
-    workspaceDir = getWorkspaceDir(platformioIni, projectPath)
     platformioSections = parsePlatformioSections(platformioIni)
+    workspaceDir = getWorkspaceDir(platformioSections, projectPath)
 
-    envs = parseEnvs(platformioIni)
+    envs = [
+        sectionName[4:]
+        for sectionName in platformioSections
+        if sectionName.startswith("env:") and sectionName[4:]
+    ]
     if not envs:
         raise SystemExit("No [env:...] sections found in platformio.ini")
 
-    envBoardMap: dict[str, str] = {}
-    envSocMap: dict[str, str] = {}
-    boardCounts: dict[str, int] = {}
-    for env in envs:
-        boardName = resolveEnvBoardName(platformioSections, env)
-        platformName = resolveEnvPlatformName(platformioSections, env)
-        socFamily = detectSocFamily(boardName, platformName)
-        envBoardMap[env] = boardName
-        envSocMap[env] = socFamily
-        boardCounts[boardName] = boardCounts.get(boardName, 0) + 1
+    envBoardMap = {env: resolveEnvBoardName(platformioSections, env) for env in envs}
+    envSocMap = {
+        env: detectSocFamily(envBoardMap[env], resolveEnvPlatformName(platformioSections, env))
+        for env in envs
+    }
+    boardCounts = Counter(envBoardMap.values())
 
     version = detectVersion(projectPath / "src")
     projectName = projectPath.name
@@ -965,50 +1174,133 @@ def main() -> int:
     print(f"Output: {targetProjectDir}")
     print(f"Workspace dir: {workspaceDir}")
 
+    envVersionDirs: dict[str, Path] = {}
     for env in envs:
         boardName = envBoardMap[env]
-        socFamily = envSocMap[env]
         if boardCounts[boardName] > 1:
             envVersionDir = targetProjectDir / env / boardName / version
         else:
             envVersionDir = targetProjectDir / boardName / version
         envVersionDir.mkdir(parents=True, exist_ok=True)
+        envVersionDirs[env] = envVersionDir
 
-        logLines: list[str] = []
-        runCommand(["pio", "run", "-e", env], projectPath, logLines)
-
-        if (projectPath / "data").is_dir():
-            try:
-                runCommand(["pio", "run", "-e", env, "-t", "buildfs"], projectPath, logLines)
-            except RuntimeError as exc:
-                logLines.append(f"WARN: buildfs niet gelukt voor {env}: {exc}")
+    envPartitionsSources = {
+        env: resolveEnvPartitionsSource(projectPath, platformioSections, env, envSocMap[env])
+        for env in envs
+    }
+    envLdscriptSources = {
+        env: resolveEnvLdscriptSource(projectPath, platformioSections, env, envSocMap[env])
+        for env in envs
+    }
 
-        envPartitionsSource = resolveEnvPartitionsSource(
-            projectPath,
-            platformioSections,
-            env,
-            socFamily,
-        )
-        envLdscriptSource = resolveEnvLdscriptSource(
-            projectPath,
-            platformioSections,
-            env,
-            socFamily,
+    dataDir = getProjectDir(platformioSections, projectPath, "data_dir", "data")
+    platformioCoreVersion = getPlatformioCoreVersion(projectPath)
+    projectFingerprint = hashFileStats(
+        collectProjectSourceFiles(projectPath, platformioSections)
+        + collectPlatformioPackageFiles(projectPath, platformioSections)
+    )
+    envFingerprints = {
+        env: hashFileStats(
+            [
+                source
+                for source in (envPartitionsSources[env], envLdscriptSources[env])
+                if source
+            ]
+            + collectEnvSourceFiles(projectPath, platformioSections, env)
+            + collectEnvLibdepsFiles(workspaceDir, env),
+            seed=":".join(
+                [projectFingerprint, platformioCoreVersion, env]
+                + [
+                    getEnvConfigValue(platformioSections, env, key) or ""
+                    for key in ("platform", "platform_packages", "framework")
+                ]
+            ),
         )
+        for env in envs
+    }
 
-        collectAndCopyArtifacts(
-            projectPath,
-            workspaceDir,
-            env,
-            boardName,
-            socFamily,
-            envVersionDir,
-            envPartitionsSource,
-            envLdscriptSource,
-            version,
-            logLines,
-        )
-        print(f"Completed for env '{env}': {envVersionDir}")
+    buildCache = {} if args.force_build else loadBuildCache(workspaceDir)
+    cachedEnvs = {
+        env
+        for env in envs
+        if isEnvBuildCached(projectPath, workspaceDir, env, envFingerprints[env], buildCache)
+    }
+
+    envLogLines: dict[str, list[str]] = {env: [] for env in envs if env not in cachedEnvs}
+    buildEnvs = list(envLogLines)
+    cpuCount = os.cpu_count() or 1
+    maxWorkers = max(1, min(len(envs), cpuCount // 4))
+    with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+        envFutures = {}
+        if buildEnvs:
+            firstEnv = buildEnvs[0]
+            envFutures[firstEnv] = executor.submit(
+                buildOneEnv, firstEnv, projectPath, dataDir, envLogLines[firstEnv], [], True
+            )
+            if envFutures[firstEnv].exception() is None:
+                cachedEnvs = {
+                    env
+                    for env in cachedEnvs
+                    if isEnvBuildCached(
+                        projectPath, workspaceDir, env, envFingerprints[env], buildCache
+                    )
+                }
+                buildEnvs = [env for env in envs if env not in cachedEnvs]
+                envLogLines.update({env: [] for env in buildEnvs if env not in envLogLines})
+                parallelWorkers = max(1, min(len(buildEnvs) - 1, maxWorkers))
+                parallelPioOptions = [
+                    "--disable-auto-clean",
+                    "-j",
+                    str(max(1, cpuCount // parallelWorkers)),
+                ]
+                for env in buildEnvs:
+                    if env == firstEnv:
+                        continue
+                    envFutures[env] = executor.submit(
+                        buildOneEnv,
+                        env,
+                        projectPath,
+                        dataDir,
+                        envLogLines[env],
+                        parallelPioOptions,
+                    )
+
+        try:
+            for env in envs:
+                if env in cachedEnvs:
+                    print(f"Skipping build for env '{env}': sources unchanged since last build")
+                    logLines = ["Build skipped: sources unchanged since last build"]
+                else:
+                    logLines = envLogLines[env]
+                    try:
+                        envFutures[env].result()
+                    finally:
+                        if env != firstEnv:
+                            for line in logLines:
+                                print(line)
+
+                collectAndCopyArtifacts(
+                    projectPath,
+                    workspaceDir,
+                    env,
+                    envBoardMap[env],
+                    envSocMap[env],
+                    envVersionDirs[env],
+                    envPartitionsSources[env],
+                    envLdscriptSources[env],
+                    version,
+                    logLines,
+                )
+
+                buildCache[env] = {
+                    "fingerprint": envFingerprints[env],
+                    "firmwareSha256": hashFileContent(envVersionDirs[env] / "firmware.bin"),
+                }
+                saveBuildCache(workspaceDir, buildCache)
+                print(f"Completed for env '{env}': {envVersionDirs[env]}")
+        except BaseException:
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
 
     if args.sync_aws:
         awsSshKey = Path(defaultAwsSshKey).expanduser().resolve()